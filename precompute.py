@@ -0,0 +1,63 @@
+import json, hashlib
+from collections import Counter, defaultdict
+
+# Facet count tables, one key each: {value: number of sections}
+FACET_FIELDS = {
+    "facets:dept": "course_dept",
+    "facets:school": "school",
+    "facets:attributes": "attributes",
+    "facets:instructors": "instructors",
+}
+
+COURSE_SECTIONS_PREFIX = "sections:course:"
+INSTRUCTOR_SECTIONS_PREFIX = "sections:instructor:"
+
+def clean_instructor(name):
+    """Strip the ' (Secondary)' marker added by extract_meetings_and_instructors."""
+    return name.removesuffix("(Secondary)").strip()
+
+def field_values(course, field):
+    value = course.get(field)
+    if not value:
+        return []
+    values = value if isinstance(value, list) else [value]
+    if field == "instructors":
+        values = [clean_instructor(v) for v in values]
+    # a section only counts once per value
+    return sorted(set(v for v in values if v))
+
+def course_sections_key(course_dept, course_code):
+    return f"{COURSE_SECTIONS_PREFIX}{course_dept}:{course_code}"
+
+def instructor_sections_key(instructor):
+    return f"{INSTRUCTOR_SECTIONS_PREFIX}{instructor}"
+
+def build_artifacts(courses):
+    """
+    Build the precomputed keys from course records (as produced by scrape_course_details).
+    Returns {redis key: JSON-serializable value}.
+    """
+    facets = {key: Counter() for key in FACET_FIELDS}
+    course_sections = defaultdict(list)
+    instructor_sections = defaultdict(list)
+
+    for course in courses:
+        for key, field in FACET_FIELDS.items():
+            facets[key].update(field_values(course, field))
+
+        if course.get("course_dept") and course.get("course_code"):
+            course_sections[course_sections_key(course["course_dept"], course["course_code"])].append(course["id"])
+        for instructor in field_values(course, "instructors"):
+            instructor_sections[instructor_sections_key(instructor)].append(course["id"])
+
+    artifacts = {key: dict(sorted(counts.items())) for key, counts in facets.items()}
+    artifacts.update({key: sorted(ids) for key, ids in course_sections.items()})
+    artifacts.update({key: sorted(ids) for key, ids in instructor_sections.items()})
+    return artifacts
+
+def serialize(value):
+    # deterministic encoding so unchanged artifacts hash the same across runs
+    return json.dumps(value, sort_keys=True, separators=(",", ":"))
+
+def digest(payload):
+    return hashlib.sha1(payload.encode()).hexdigest()
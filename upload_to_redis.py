@@ -5,54 +5,156 @@ from tqdm import tqdm
 from dotenv import load_dotenv
 from redis.commands.search.field import TextField, NumericField, TagField
 from redis.commands.search.indexDefinition import IndexDefinition, IndexType
+from precompute import build_artifacts, serialize, digest
 
 BATCH_SIZE = 500
+PRECOMPUTED_MANIFEST = "precomputed:manifest"  # hash of precomputed key -> digest of its value
 
-def create_index(r: redis.Redis):
+# Queries always go through this alias; the concrete index behind it is versioned
+# (idx:courses:vN) so schema changes can be built in the background and swapped in.
+INDEX_ALIAS = "idx:courses"
+SCHEMA_VERSION = 2
+INDEX_BUILD_TIMEOUT = 600  # seconds to wait for a new index to finish its background scan
+
+# Size fields reported by FT.INFO, in MB
+INDEX_MEMORY_FIELDS = [
+    "inverted_sz_mb",
+    "offset_vectors_sz_mb",
+    "doc_table_size_mb",
+    "sortable_values_size_mb",
+    "key_table_size_mb",
+    "text_overhead_sz_mb",
+    "tag_overhead_sz_mb",
+    "total_index_memory_sz_mb",
+]
+
+def build_schema():
+    # Full-text only where users actually type free text; low-cardinality enums are tags
+    # (exact-match filters, no stemming/offset vectors). `dates` and `session` are display-only
+    # and are not indexed at all, and `school` is covered by `school_tag`; they are all still
+    # returned from the JSON document.
+    return [
+        TagField("$.id", as_name="id"),
+        TagField("$.course_dept_tag", as_name="course_dept_tag"), # for filtering
+        TextField("$.course_dept", as_name="course_dept", weight=2, no_stem=True),
+        TextField("$.course_code", as_name="course_code", weight=2, no_stem=True),
+        TagField("$.class_section", as_name="class_section"),
+        TextField("$.course_title", as_name="course_title", weight=2),
+        TagField("$.school_tag", as_name="school_tag"), # for filtering
+        TagField("$.career", as_name="career"),
+        TagField("$.class_type", as_name="class_type"),
+        TagField("$.credit_hours", as_name="credit_hours"),
+        TagField("$.grading_basis", as_name="grading_basis"),
+        TagField("$.consent", as_name="consent"),
+        NumericField("$.term_year", as_name="term_year"),
+        TagField("$.term_season", as_name="term_season"),
+        TextField("$.requirements", as_name="requirements", no_stem=True),
+        TextField("$.description", as_name="description"),
+        TextField("$.notes", as_name="notes"),
+        TagField("$.status", as_name="status"),
+        NumericField("$.capacity", as_name="capacity"),
+        NumericField("$.enrolled", as_name="enrolled"),
+        NumericField("$.wl_capacity", as_name="wl_capacity"),
+        NumericField("$.wl_occupied", as_name="wl_occupied"),
+        TagField("$.attributes", as_name="attributes"),
+        TagField("$.meeting_days", as_name="meeting_days"),
+        TagField("$.meeting_times", as_name="meeting_times"),
+        TagField("$.meeting_dates", as_name="meeting_dates"),
+        TextField("$.instructors[*]", as_name="instructors", no_stem=True),
+    ]
+
+def versioned_index_name(version=SCHEMA_VERSION):
+    return f"{INDEX_ALIAS}:v{version}"
+
+def _to_str(value):
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+def get_index_info(r: redis.Redis, name):
+    """FT.INFO for an index or alias, or None if it doesn't exist."""
     try:
-        schema = [
-            TextField("$.id", as_name="id"),
-            TagField("$.course_dept_tag", as_name="course_dept_tag"), # for filtering
-            TextField("$.course_dept", as_name="course_dept", weight=2),
-            TextField("$.course_code", as_name="course_code", weight=2),
-            TextField("$.class_section", as_name="class_section"),
-            TextField("$.course_title", as_name="course_title", weight=2),
-            TagField("$.school_tag", as_name="school_tag"), # for filtering
-            TextField("$.school", as_name="school"),
-            TextField("$.career", as_name="career"),
-            TextField("$.class_type", as_name="class_type"),
-            TextField("$.credit_hours", as_name="credit_hours"),
-            TextField("$.grading_basis", as_name="grading_basis"),
-            TextField("$.consent", as_name="consent"),
-            NumericField("$.term_year", as_name="term_year"),
-            TextField("$.term_season", as_name="term_season"),
-            TextField("$.session", as_name="session"),
-            TextField("$.dates", as_name="dates"),
-            TextField("$.requirements", as_name="requirements"),
-            TextField("$.description", as_name="description"),
-            TextField("$.notes", as_name="notes"),
-            TextField("$.status", as_name="status"),
-            NumericField("$.capacity", as_name="capacity"),
-            NumericField("$.enrolled", as_name="enrolled"),
-            NumericField("$.wl_capacity", as_name="wl_capacity"),
-            NumericField("$.wl_occupied", as_name="wl_occupied"),
-            TagField("$.attributes", as_name="attributes"),
-            TagField("$.meeting_days", as_name="meeting_days"),
-            TagField("$.meeting_times", as_name="meeting_times"),
-            TagField("$.meeting_dates", as_name="meeting_dates"),
-            TextField("$.instructors[*]", as_name="instructors", no_stem=True),
-        ]
-
-        r.ft("idx:courses").create_index(
-            fields=schema,
+        return r.ft(name).info()
+    except redis.ResponseError as e:
+        msg = str(e).lower()
+        if "unknown index" in msg or "no such index" in msg or "not found" in msg:
+            return None
+        raise
+
+def index_memory_report(info):
+    """Pull the size fields (MB) out of an FT.INFO result."""
+    report = {"num_docs": int(float(_to_str(info.get("num_docs", 0))))}
+    for field in INDEX_MEMORY_FIELDS:
+        if field in info:
+            report[field] = float(_to_str(info[field]))
+    return report
+
+def print_index_memory(name, report, baseline=None):
+    print(f"Index memory for '{name}' ({report['num_docs']} docs):")
+    for field in INDEX_MEMORY_FIELDS:
+        if field not in report:
+            continue
+        line = f"  {field:<26} {report[field]:>10.3f} MB"
+        if baseline and field in baseline:
+            line += f"  ({report[field] - baseline[field]:+.3f} MB vs previous)"
+        print(line)
+
+def wait_for_indexing(r: redis.Redis, name, timeout=INDEX_BUILD_TIMEOUT):
+    """Block until the background scan of a freshly created index is done."""
+    start_time = time.time()
+    while True:
+        info = r.ft(name).info()
+        indexing = int(float(_to_str(info.get("indexing", 0))))
+        percent = float(_to_str(info.get("percent_indexed", 1)))
+        if not indexing and percent >= 1:
+            return info
+        if time.time() - start_time > timeout:
+            raise TimeoutError(f"Index '{name}' still building after {timeout}s ({percent:.0%} indexed)")
+        print(f"Waiting for '{name}' to finish indexing ({percent:.0%})...")
+        time.sleep(1)
+
+def create_index(r: redis.Redis):
+    """
+    Make sure INDEX_ALIAS points at an index built with the current schema version.
+
+    A new schema is built as idx:courses:vN next to the live one; once its background scan
+    completes the alias is swapped with FT.ALIASUPDATE, so queries never see a half-built index.
+    The previous index is dropped afterwards (documents are kept).
+    """
+    target = versioned_index_name()
+    current = get_index_info(r, INDEX_ALIAS)
+    current_name = _to_str(current["index_name"]) if current else None
+
+    if current_name == target:
+        print(f"Index '{INDEX_ALIAS}' already on schema v{SCHEMA_VERSION} ({target}), skipping creation.")
+        return
+
+    if get_index_info(r, target) is None:
+        r.ft(target).create_index(
+            fields=build_schema(),
             definition=IndexDefinition(prefix=["course:"], index_type=IndexType.JSON)
         )
-        print("Index created.")
-    except redis.ResponseError as e:
-        if "Index already exists" in str(e):
-            print("Index already exists, skipping creation.")
-        else:
-            raise
+        print(f"Index '{target}' created, building in background.")
+    else:
+        print(f"Index '{target}' already exists (previous run interrupted?), reusing it.")
+
+    new_info = wait_for_indexing(r, target)
+
+    if current is None:
+        r.ft(target).aliasadd(INDEX_ALIAS)
+        print(f"Alias '{INDEX_ALIAS}' -> '{target}' added.")
+    elif current_name == INDEX_ALIAS:
+        # Legacy unversioned index occupies the alias name; it has to go before the alias can be
+        # added. This is the only migration with a (brief) gap, later ones swap atomically.
+        r.ft(INDEX_ALIAS).dropindex(delete_documents=False)
+        r.ft(target).aliasadd(INDEX_ALIAS)
+        print(f"Replaced legacy index '{INDEX_ALIAS}' with alias -> '{target}'.")
+    else:
+        r.ft(target).aliasupdate(INDEX_ALIAS)
+        r.ft(current_name).dropindex(delete_documents=False)
+        print(f"Alias '{INDEX_ALIAS}' swapped '{current_name}' -> '{target}', old index dropped.")
+
+    baseline = index_memory_report(current) if current else None
+    print_index_memory(target, index_memory_report(new_info), baseline=baseline)
+
 def upload_courses(r: redis.Redis, courses, dont_skip_unchanged=False):
     # Merge with existing compressed data to avoid losing data from failed scrapes
     existing_courses = {}
@@ -139,18 +241,58 @@ def upload_courses(r: redis.Redis, courses, dont_skip_unchanged=False):
     print(f"\nAll courses uploaded in {total_elapsed:.1f} seconds")
     print(f"Summary: {new_courses} new, {updated_courses} updated, {skipped_courses} unchanged/skipped")
     print(f"Stored {len(merged_courses)} courses into 'courses:all:compressed' (merged from existing data)")
+    return merged_courses
+
+def upload_precomputed(r: redis.Redis, courses):
+    """
+    Upload facet count tables and section lookup maps as plain JSON strings (single GET to read).
+    Only keys whose contents changed since the last run are written; keys that no longer
+    apply (e.g. an instructor with no sections left) are deleted.
+    """
+    artifacts = {key: serialize(value) for key, value in build_artifacts(courses).items()}
+    digests = {key: digest(payload) for key, payload in artifacts.items()}
+
+    previous = {k.decode(): v.decode() for k, v in r.hgetall(PRECOMPUTED_MANIFEST).items()}
+    changed = [key for key, d in digests.items() if previous.get(key) != d]
+    removed = [key for key in previous if key not in digests]
+
+    pipe = r.pipeline(transaction=False)
+    for i, key in enumerate(changed, 1):
+        pipe.set(key, artifacts[key])
+        pipe.hset(PRECOMPUTED_MANIFEST, key, digests[key])
+        if i % BATCH_SIZE == 0:
+            pipe.execute()
+    for i, key in enumerate(removed, 1):
+        pipe.delete(key)
+        pipe.hdel(PRECOMPUTED_MANIFEST, key)
+        if i % BATCH_SIZE == 0:
+            pipe.execute()
+    pipe.execute()
+
+    print(f"Precomputed keys: {len(changed)} refreshed, {len(removed)} removed, {len(digests) - len(changed)} unchanged")
 
 def main():
     parser = argparse.ArgumentParser(description="Upload course data to Redis with optional skip-unchanged")
-    parser.add_argument("data_file", help="Path to JSON data file")
+    parser.add_argument("data_file", nargs="?", help="Path to JSON data file")
     parser.add_argument("--dont-skip-unchanged", action="store_true", help="Don't skip unchanged fields (overwrite all fields)")
+    parser.add_argument("--index-report", action="store_true", help="Only print index memory usage and exit")
     args = parser.parse_args()
+    if not args.data_file and not args.index_report:
+        parser.error("data_file is required unless --index-report is given")
 
     # Load environment variables from .env
     load_dotenv()
     redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
     r = redis.Redis.from_url(redis_url)
 
+    if args.index_report:
+        info = get_index_info(r, INDEX_ALIAS)
+        if info is None:
+            print(f"Index '{INDEX_ALIAS}' does not exist.")
+        else:
+            print_index_memory(_to_str(info["index_name"]), index_memory_report(info))
+        return
+
     # Clear all data from Redis (comment out if you want to update existing data)
     # r.flushall()
 
@@ -168,7 +310,9 @@ def main():
         c["school_tag"] = c.get("school", "")
 
     create_index(r)
-    upload_courses(r, courses, dont_skip_unchanged=not args.dont_skip_unchanged)
+    merged_courses = upload_courses(r, courses, dont_skip_unchanged=not args.dont_skip_unchanged)
+    upload_precomputed(r, merged_courses)
+    print_index_memory(versioned_index_name(), index_memory_report(r.ft(INDEX_ALIAS).info()))
 
 if __name__ == "__main__":
     main()